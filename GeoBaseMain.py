@@ -5,27 +5,57 @@
 This module is a launcher for the GeoBases package.
 """
 
-from sys import stdin, stderr, argv
+import sys
 import os
 import os.path as op
 
 from math import ceil, log
-from itertools import izip_longest, chain
+import heapq
+from itertools import izip, izip_longest, chain, imap
+from operator import itemgetter
 from textwrap import dedent
 import platform
 import re
+import string
+import gc
+import cPickle
+import hashlib
 
 # Not in standard library
-from termcolor import colored
-import colorama
+# termcolor and colorama are imported only when needed
 import argparse # in standard libraray for Python >= 2.7
 
 # Private
-from GeoBases import GeoBase, DEFAULTS, SourcesManager, is_remote, is_archive
+from GeoBases import GeoBase, DEFAULTS, is_remote, is_archive
+from GeoBases import GeoBaseModule
 
 
 IS_WINDOWS = platform.system() in ('Windows',)
 
+# Filled by get_term_size on first call
+TERM_SIZE_CACHE = []
+
+# ANSI escape codes, the same as termcolor, which is not
+# used on the display hot path
+ANSI_COLORS = dict(zip(['grey', 'red', 'green', 'yellow',
+                        'blue', 'magenta', 'cyan', 'white'], range(30, 38)))
+
+ANSI_HIGHLIGHTS = dict(('on_%s' % c, n + 10) for c, n in ANSI_COLORS.iteritems())
+
+ANSI_ATTRIBUTES = {
+    'bold'      : 1,
+    'dark'      : 2,
+    'underline' : 4,
+    'blink'     : 5,
+    'reverse'   : 7,
+    'concealed' : 8,
+}
+
+ANSI_RESET = '\033[0m'
+
+# Filled by ansi_codes
+ANSI_CACHE = {}
+
 if not IS_WINDOWS:
     import signal
     # On windows, SIGPIPE does not exist
@@ -138,6 +168,18 @@ def get_stty_size():
 def get_term_size():
     """
     This gives terminal size information.
+    The size is computed only once, then cached for the
+    rest of the process.
+    """
+    if not TERM_SIZE_CACHE:
+        TERM_SIZE_CACHE.append(compute_term_size())
+
+    return TERM_SIZE_CACHE[0]
+
+
+def compute_term_size():
+    """
+    This computes terminal size information.
     """
     try:
         import fcntl, termios, struct
@@ -160,7 +202,8 @@ def get_term_size():
             fd = os.open(os.ctermid(), os.O_RDONLY)
             cr = ioctl_GWINSZ(fd)
             os.close(fd)
-        except IOError:
+        except (IOError, OSError):
+            # No controlling terminal
             pass
 
     if not cr:
@@ -343,10 +386,10 @@ def fmt_ref(ref, ref_type, no_symb=False):
 
 
 
-def display_terminal(geob, list_of_things, shown_fields, ref_type, important):
+def display_terminal(geob, list_of_things, shown_fields, ref_type, important, colors=True):
     """
     Main display function in Linux terminal, with
-    nice color and everything.
+    nice color and everything, unless colors is False.
     """
     if not list_of_things:
         print 'No elements to display.'
@@ -361,22 +404,55 @@ def display_terminal(geob, list_of_things, shown_fields, ref_type, important):
 
     if n == 1:
         # We do not truncate names if only one result
-        truncate = None
+        truncate = 1000
     else:
         truncate = lim
 
+    # Something like '%-25.25s', built once for all cells
+    printer = '%%-%s.%ss' % (lim, truncate)
+
+    # Formatted cells, values are often repeated
+    # (empty values, country codes, time zones, ...)
+    cells = {}
+
+    def line_cells(values, ansi):
+        """Format a line of cells, only once for each value and color.
+        New non-ascii values are decoded all at once with a separator.
+        """
+        values = [str(s) for s in values]
+        new = [s for s in set(values) if (s, ansi) not in cells]
+
+        non_ascii = [s for s in new if NON_ASCII_REG.search(s)]
+        decoded   = {}
+
+        if non_ascii:
+            ds_list = CELL_SEP.join(non_ascii).decode('utf8').split(CELL_SEP)
+
+            # If the separator was in some value, fixed_width will do it
+            if len(ds_list) == len(non_ascii):
+                decoded = dict(izip(non_ascii, ds_list))
+
+        for s in new:
+            if s in decoded:
+                cells[s, ansi] = fixed_width_decoded(decoded[s], ansi, printer, truncate)
+            else:
+                cells[s, ansi] = fixed_width(s, ansi, printer, truncate)
+
+        return [cells[s, ansi] for s in values]
+
     c = RotatingColors(BACKGROUND_COLOR)
 
+    # Lines are written all at once at the end
+    lines = []
+
+    get = geob.get
+
+    # Records fetched once, plain fields are read directly
+    recs = [get(k) for _, k in list_of_things]
+
     for f in shown_fields:
         # Computing clean fields, external fields, ...
-        if f == REF:
-            cf = REF
-        else:
-            cf, ext_f = check_ext_field(geob, f)
-            if ext_f is None:
-                get = lambda k: geob.get(k, cf)
-            else:
-                get = lambda k: geob.get(k, cf, ext_field=ext_f)
+        cf, ext_f = check_ext_field(geob, f)
 
         if cf in important:
             col = c.getEmph()
@@ -393,18 +469,25 @@ def display_terminal(geob, list_of_things, shown_fields, ref_type, important):
         if geob.hasJoin(cf):
             col = c.convertJoin(col) # For joined fields
 
+        # Escape sequences are computed once per line
+        ansi = ansi_codes(col, colors)
+
         # Fields on the left
-        l = [fixed_width(f, c.convertBold(col), lim, truncate)]
+        l = [fixed_width(f, ansi_codes(c.convertBold(col), colors), printer, truncate)]
 
         if f == REF:
-            for h, _ in list_of_things:
-                l.append(fixed_width(fmt_ref(h, ref_type), col, lim, truncate))
+            values = [fmt_ref(h, ref_type) for h, _ in list_of_things]
+        elif ext_f is None:
+            values = [rec[cf] for rec in recs]
         else:
-            for _, k in list_of_things:
-                l.append(fixed_width(get(k), col, lim, truncate))
+            values = [get(k, cf, ext_field=ext_f) for _, k in list_of_things]
+
+        l.extend(line_cells(values, ansi))
 
         next(c)
-        print ''.join(l)
+        lines.append(''.join(l))
+
+    sys.stdout.write('\n'.join(lines) + '\n')
 
 
 def fields_to_show(defaults, omit, show, show_additional):
@@ -447,33 +530,35 @@ def display_quiet(geob, list_of_things, shown_fields, ref_type, delim, header):
     # Headers joined
     j_headers = delim.join(str(f) for f in shown_fields)
 
+    # Lines are written all at once at the end
+    lines = []
+
     # Displaying headers only for RH et CH
     if header == 'RH':
-        print j_headers
+        lines.append(j_headers)
     elif header == 'CH':
-        print '#%s' % j_headers
+        lines.append('#%s' % j_headers)
 
-    # Caching getters
-    getters = {}
-    for f in shown_fields:
-        if f == REF:
-            continue
-        cf, ext_f = check_ext_field(geob, f)
-        if ext_f is None:
-            getters[f] = cf, ext_f, lambda k, cf, ext_f: geob.get(k, cf)
-        else:
-            getters[f] = cf, ext_f, lambda k, cf, ext_f: geob.get(k, cf, ext_field=ext_f)
+    # Computing clean fields and external fields once,
+    # in the same order as shown_fields
+    clean_fields = [check_ext_field(geob, f) for f in shown_fields]
+
+    get = geob.get
 
     for h, k in list_of_things:
+        # Record fetched once, plain fields are read directly
+        rec = get(k)
+
         l = []
-        for f in shown_fields:
-            if f == REF:
+        for cf, ext_f in clean_fields:
+            if cf == REF:
                 l.append(fmt_ref(h, ref_type, no_symb=True))
             else:
-                # Get from getters cache
-                cf, ext_f, get = getters[f]
+                if ext_f is None:
+                    v = rec[cf]
+                else:
+                    v = get(k, cf, ext_field=ext_f)
 
-                v = get(k, cf, ext_f)
                 # Small workaround to display nicely lists in quiet mode
                 # Fields @raw are already handled with raw version, but
                 # __dup__ field has no raw version for dumping
@@ -482,7 +567,10 @@ def display_quiet(geob, list_of_things, shown_fields, ref_type, delim, header):
                 else:
                     l.append(str(v) if v is not None else '')
 
-        print delim.join(l)
+        lines.append(delim.join(l))
+
+    if lines:
+        sys.stdout.write('\n'.join(lines) + '\n')
 
 
 def display_browser(templates, output_dir, nb_res):
@@ -556,30 +644,99 @@ def launch_http_server(address, port):
 
 
 
-def fixed_width(s, col, lim=25, truncate=None):
+def ansi_codes(col, colors=True):
+    """
+    Compute the escape sequences put before and after
+    a string displayed with color col, as a couple.
+    Results are cached in ANSI_CACHE.
+    If colors is False, there are no escape sequences.
+
+    >>> ansi_codes(('white', 'on_blue', ['bold']))
+    ('\\x1b[1m\\x1b[44m\\x1b[37m', '\\x1b[0m')
+    >>> ansi_codes(('red', None, []))
+    ('\\x1b[31m', '\\x1b[0m')
+    >>> ansi_codes(('red', None, []), colors=False)
+    ('', '')
+    """
+    if not colors:
+        return '', ''
+
+    color, on_color, attrs = col
+    key = color, on_color, tuple(attrs)
+
+    if key not in ANSI_CACHE:
+        if os.getenv('ANSI_COLORS_DISABLED') is not None:
+            ANSI_CACHE[key] = '', ''
+
+        elif color in ANSI_COLORS and \
+             (on_color is None or on_color in ANSI_HIGHLIGHTS) and \
+             all(a in ANSI_ATTRIBUTES for a in attrs):
+            # Same order as termcolor: attributes, highlight, color
+            codes = [ANSI_ATTRIBUTES[a] for a in reversed(attrs)]
+            if on_color is not None:
+                codes.append(ANSI_HIGHLIGHTS[on_color])
+            codes.append(ANSI_COLORS[color])
+
+            ANSI_CACHE[key] = ''.join('\033[%dm' % c for c in codes), ANSI_RESET
+
+        else:
+            # Fallback for what we do not know about
+            from termcolor import colored
+            ANSI_CACHE[key] = tuple(colored('|', *col).split('|', 1))
+
+    return ANSI_CACHE[key]
+
+
+# Only these need decoding to be counted as characters
+NON_ASCII_REG = re.compile(r'[\x80-\xff]')
+
+TRUNCATE_MARK = '… '
+
+# Separator used to decode several cells at once
+CELL_SEP = '\x1f'
+
+def fixed_width(s, ansi, printer, truncate):
     """
     This function is useful to display a string in the
     terminal with a fixed width. It is especially
     tricky with unicode strings containing accents.
+
+    ansi is the couple of escape sequences from ansi_codes,
+    printer is the padding format, like '%-25.25s'.
     """
-    if truncate is None:
-        truncate = 1000
+    s = str(s)
 
-    printer = '%%-%ss' % lim # is something like '%-3s'
+    if NON_ASCII_REG.search(s) is not None:
+        # To truncate on the appropriate number of characters
+        # We decode before truncating (so non-ascii characters
+        # will be counted only once when using len())
+        return fixed_width_decoded(s.decode('utf8'), ansi, printer, truncate)
 
-    # To truncate on the appropriate number of characters
-    # We decode before truncating (so non-ascii characters
-    # will be counted only once when using len())
-    # Then we encode again before display
-    ds = str(s).decode('utf8')                      # decode
-    es = (printer % ds[0:truncate]).encode('utf8')  # encode
+    # Pure ascii, bytes and characters are the same
+    es = printer % s
+
+    if len(s) > truncate:
+        es = es[:-2] + TRUNCATE_MARK
+
+    return ansi[0] + es + ansi[1]
+
+
+def fixed_width_decoded(ds, ansi, printer, truncate):
+    """
+    Same as fixed_width, for an already decoded string.
+    """
+    # We encode again before display
+    es = (printer % ds).encode('utf8')
 
     if len(ds) > truncate:
-        es = es[:-2] + '… '
+        es = es[:-2] + TRUNCATE_MARK
 
-    return colored(es, *col)
+    return ansi[0] + es + ansi[1]
 
 
+# Characters in geocodes, once separators are replaced by spaces
+GEOCODE_CHARS = frozenset('0123456789.+-eE' + string.whitespace)
+
 def scan_coords(u_input, geob, verbose):
     """
     This function tries to interpret the main
@@ -596,20 +753,24 @@ def scan_coords(u_input, geob, verbose):
         return coords
 
     # Then we try input as geocode
-    try:
-        free_geo = u_input.strip('()')
+    free_geo = u_input.strip('()')
 
-        for char in '\\', '"', "'":
-            free_geo = free_geo.replace(char, '')
+    for char in '\\', '"', "'":
+        free_geo = free_geo.replace(char, '')
 
-        for sep in '^', ';', ',':
-            free_geo = free_geo.replace(sep, ' ')
+    for sep in '^', ';', ',':
+        free_geo = free_geo.replace(sep, ' ')
 
-        coords = tuple(float(l) for l in free_geo.split())
-
-    except ValueError:
-        pass
+    # Cheap test before parsing, most non-geocodes fail here
+    if not GEOCODE_CHARS.issuperset(free_geo):
+        coords = None
     else:
+        try:
+            coords = tuple(float(l) for l in free_geo.split())
+        except ValueError:
+            coords = None
+
+    if coords is not None:
         if len(coords) == 2        and \
            -90  <= coords[0] <= 90 and \
            -180 <= coords[1] <= 180:
@@ -863,6 +1024,100 @@ def to_CLI(option, value):
 
 
 
+def base_dependencies(geob):
+    """
+    List the files a loaded base depends on: the sources
+    configuration, the GeoBase module and the loaded data,
+    including data from the external bases used for join.
+    """
+    deps = [S_MANAGER.sources_conf_path, GEOBASE_MODULE_PATH]
+
+    for b in [geob] + geob._ext_bases.values():
+        if isinstance(b.loaded, str):
+            deps.append(b.loaded)
+
+    return deps
+
+
+def is_fresh(path, deps):
+    """Tells if path is more recent than all its dependencies.
+    """
+    try:
+        mtime = op.getmtime(path)
+        return all(op.getmtime(d) < mtime for d in deps)
+    except OSError:
+        return False
+
+
+def load_base(data, **options):
+    """
+    Load a base from the sources, or from the pickled version
+    stored in cache if it is more recent than its dependencies.
+    Unpickling is a lot faster than parsing the source files.
+    Bases are loaded without verbosity, as loading messages
+    would not be displayed when using the cache.
+    """
+    key = hashlib.sha1(repr((data, sorted(options.items())))).hexdigest()
+    path = op.join(BASES_CACHE_DIR, '%s_%s.pkl' % (data, key))
+
+    if op.isfile(path):
+        # Many containers are created here, the garbage
+        # collector would only slow things down
+        gc.disable()
+        try:
+            with open(path, 'rb') as fl:
+                deps = cPickle.load(fl)
+                if is_fresh(path, deps):
+                    return cPickle.load(fl)
+
+        except (IOError, EOFError, ValueError, cPickle.UnpicklingError):
+            # Corrupted file, we will overwrite it
+            pass
+        finally:
+            gc.enable()
+
+    geob = GeoBase(data=data, verbose=False, **options)
+
+    # Pickle is written next to its final name, then renamed,
+    # so other processes never read a partial file
+    tmp_path = '%s.%s' % (path, os.getpid())
+    try:
+        if not op.isdir(BASES_CACHE_DIR):
+            os.makedirs(BASES_CACHE_DIR)
+
+        with open(tmp_path, 'wb') as fl:
+            cPickle.dump(base_dependencies(geob), fl, cPickle.HIGHEST_PROTOCOL)
+            cPickle.dump(geob, fl, cPickle.HIGHEST_PROTOCOL)
+
+        os.rename(tmp_path, path)
+
+    except (IOError, OSError, cPickle.PicklingError):
+        # Cache is not mandatory, but partial files are not left behind
+        if op.isfile(tmp_path):
+            os.remove(tmp_path)
+    else:
+        evict_bases(BASES_CACHE_SIZE)
+
+    return geob
+
+
+def evict_bases(size):
+    """
+    Remove the oldest files in the cache of bases,
+    so that at most size files are kept.
+    """
+    try:
+        paths = [op.join(BASES_CACHE_DIR, f) for f in os.listdir(BASES_CACHE_DIR)]
+        paths.sort(key=op.getmtime, reverse=True)
+
+        for path in paths[size:]:
+            os.remove(path)
+
+    except OSError:
+        # Other processes may be removing files as well
+        pass
+
+
 def best_field(candidates, possibilities, default=None):
     """Select best candidate in possibilities.
     """
@@ -877,11 +1132,11 @@ def warn(name, *args):
     Display a warning on stderr.
     """
     if name == 'key':
-        print >> stderr, '/!\ Key %s was not in base, for data "%s" and source %s' % \
+        print >> sys.stderr, '/!\ Key %s was not in base, for data "%s" and source %s' % \
                 (args[0], args[1], args[2])
 
     if name == 'installation':
-        print >> stderr, '/!\ %s is not installed, no package information available.' % \
+        print >> sys.stderr, '/!\ %s is not installed, no package information available.' % \
                 args[0]
 
 
@@ -891,44 +1146,41 @@ def error(name, *args):
     First argument is the error type.
     """
     if name == 'trep_support':
-        print >> stderr, '\n/!\ No opentrep support. Check if OpenTrepWrapper can import libpyopentrep.'
+        print >> sys.stderr, '\n/!\ No opentrep support. Check if OpenTrepWrapper can import libpyopentrep.'
 
     elif name == 'geocode_support':
-        print >> stderr, '\n/!\ No geocoding support for data type %s.' % args[0]
+        print >> sys.stderr, '\n/!\ No geocoding support for data type %s.' % args[0]
 
     elif name == 'data':
-        print >> stderr, '\n/!\ Wrong data type "%s". You may select:' % args[0]
-        for p in build_pairs(args[1]):
-            print >> stderr, '\t%-20s\t%-20s' % p
+        print >> sys.stderr, '\n/!\ Wrong data type "%s". You may select:' % args[0]
+        sys.stderr.writelines(two_col_lines(args[1]))
 
     elif name == 'field':
-        print >> stderr, '\n/!\ Wrong field "%s".' % args[0]
-        print >> stderr, 'For data type "%s", you may select:' % args[1]
-        for p in build_pairs(args[2]):
-            print >> stderr, '\t%-20s\t%-20s' % p
+        print >> sys.stderr, '\n/!\ Wrong field "%s".' % args[0]
+        print >> sys.stderr, 'For data type "%s", you may select:' % args[1]
+        sys.stderr.writelines(two_col_lines(args[2]))
 
     elif name == 'geocode_format':
-        print >> stderr, '\n/!\ Bad geocode format: %s' % args[0]
+        print >> sys.stderr, '\n/!\ Bad geocode format: %s' % args[0]
 
     elif name == 'geocode_unknown':
-        print >> stderr, '\n/!\ Geocode was unknown for %s' % args[0]
+        print >> sys.stderr, '\n/!\ Geocode was unknown for %s' % args[0]
 
     elif name == 'empty_stdin':
-        print >> stderr, '\n/!\ Stdin was empty'
+        print >> sys.stderr, '\n/!\ Stdin was empty'
 
     elif name == 'wrong_value':
-        print >> stderr, '\n/!\ Wrong value "%s", should be in:' % args[0]
-        for p in build_pairs(args[1]):
-            print >> stderr, '\t%-20s\t%-20s' % p
+        print >> sys.stderr, '\n/!\ Wrong value "%s", should be in:' % args[0]
+        sys.stderr.writelines(two_col_lines(args[1]))
 
     elif name == 'type':
-        print >> stderr, '\n/!\ Wrong type for "%s", should be "%s".' % (args[0], args[1])
+        print >> sys.stderr, '\n/!\ Wrong type for "%s", should be "%s".' % (args[0], args[1])
 
     elif name == 'aborting':
-        print >> stderr, '\n\n/!\ %s' % args[0]
+        print >> sys.stderr, '\n\n/!\ %s' % args[0]
 
     elif name == 'not_allowed':
-        print >> stderr, '\n/!\ Value "%s" not allowed.' % args[0]
+        print >> sys.stderr, '\n/!\ Value "%s" not allowed.' % args[0]
 
     exit(1)
 
@@ -969,8 +1221,14 @@ PACKAGE_NAME = 'GeoBases'
 SCRIPT_NAME  = 'GeoBase'
 DESCRIPTION  = 'Data services and visualization'
 
-# Sources manager
-S_MANAGER = SourcesManager()
+# Sources manager, the one already loaded by GeoBase
+S_MANAGER = GeoBaseModule.S_MANAGER
+
+# Loaded bases are pickled here, see load_base
+# Only the most recent ones are kept, they are big
+BASES_CACHE_DIR     = op.join(S_MANAGER.cache_dir, 'bases')
+BASES_CACHE_SIZE    = 5
+GEOBASE_MODULE_PATH = GeoBaseModule.__file__
 
 # Contact info
 CONTACT_INFO = '''
@@ -998,7 +1256,7 @@ CLI_EXAMPLES = '''
  $ %s --admin                    # administrate the data sources
  $ %s --help                     # your best friend
  $ cat data.csv | %s             # with your data
-''' % ((op.basename(argv[0]),) * 7)
+''' % ((op.basename(sys.argv[0]),) * 7)
 
 DEF_BASE            = 'ori_por'
 DEF_FUZZY_LIMIT     = 0.85
@@ -1406,6 +1664,15 @@ def handle_args():
         metavar = 'OPTION',
         default = [])
 
+    parser.add_argument('-k', '--pickle-cache',
+        help = dedent('''\
+        Load the base from a pickled version stored in cache,
+        if it is more recent than the data, or store it there
+        after loading. This is faster, but unsorted results may
+        then come in a different order. Not used with --verbose.
+        '''),
+        action = 'store_true')
+
     parser.add_argument('-I', '--interactive-query',
         help = dedent('''\
         If given, this option will consider stdin
@@ -2060,13 +2327,16 @@ def admin_mode(admin, with_hints=True, verbose=True):
                 print '\n===== Restart shell now.'
 
 
+def two_col_lines(L):
+    """Format enumerable on two columns, as lines.
+    """
+    return ['\t%-20s\t%-20s\n' % p for p in build_pairs(L)]
+
+
 def two_col_print(L):
     """Display enumerable on two columns.
     """
-    print
-    for p in build_pairs(L):
-        print '\t%-20s\t%-20s' % p
-    print
+    sys.stdout.writelines(['\n'] + two_col_lines(L) + ['\n'])
 
 
 def ask_mode():
@@ -2245,10 +2515,6 @@ def main():
     """
     Arguments handling.
     """
-    # Filter colored signals on terminals.
-    # Necessary for Windows CMD
-    colorama.init()
-
     #
     # COMMAND LINE MANAGEMENT
     args = handle_args()
@@ -2271,6 +2537,15 @@ def main():
     else:
         frontend = 'terminal'
 
+    # Filter colored signals on terminals.
+    # Necessary for Windows CMD, but not when quiet or piped:
+    # in this last case we just do not produce colors
+    with_colors = sys.stdout.isatty()
+
+    if with_colors and frontend != 'quiet':
+        import colorama
+        colorama.init()
+
     if args['limit'] is None:
         # Limit was not set by user
         if frontend == 'terminal':
@@ -2292,8 +2567,8 @@ def main():
     # CREATION
     #
     if logorrhea:
-        from datetime import datetime
-        before_init = datetime.now()
+        from time import time
+        before_init = time()
 
     if args['version']:
         import pkg_resources
@@ -2339,13 +2614,13 @@ def main():
         error('data', args['base'], sorted(S_MANAGER))
 
 
-    if not stdin.isatty() and not interactive_query_mode:
+    if not sys.stdin.isatty() and not interactive_query_mode:
         try:
-            first_l = stdin.next()
+            first_l = sys.stdin.next()
         except StopIteration:
             error('empty_stdin')
 
-        source  = chain([first_l], stdin)
+        source  = chain([first_l], sys.stdin)
         first_l = first_l.rstrip() # For sniffers, we rstrip
 
         delimiter  = guess_delimiter(first_l)
@@ -2480,10 +2755,13 @@ def main():
                 print 'Loading "%s" with custom: %s ...' % \
                         (args['base'], ' ; '.join('%s = %s' % kv for kv in add_options.items()))
 
-        g = GeoBase(data=args['base'], verbose=logorrhea, **add_options)
+        if args['pickle_cache'] and not logorrhea:
+            g = load_base(args['base'], **add_options)
+        else:
+            g = GeoBase(data=args['base'], verbose=logorrhea, **add_options)
 
     if logorrhea:
-        after_init = datetime.now()
+        after_init = time()
 
     # Tuning parameters
     if args['exact_field'] is None or args['exact_field'] == SKIP:
@@ -2594,18 +2872,22 @@ def main():
         if not g.hasGeoSupport():
             error('geocode_support', g.data)
 
+    # Sets of allowed fields, for fast membership tests
+    base_fields  = frozenset(g.fields)
+    valid_fields = base_fields | frozenset([REF])
+
     # Failing on wrong headers
     if args['exact'] is not None:
         for field in exact_fields:
-            if field not in g.fields:
+            if field not in base_fields:
                 error('field', field, g.data, sorted(g.fields))
 
     if args['fuzzy'] is not None:
-        if args['fuzzy_field'] not in g.fields:
+        if args['fuzzy_field'] not in base_fields:
             error('field', args['fuzzy_field'], g.data, sorted(g.fields))
 
     if args['phonetic'] is not None:
-        if args['phonetic_field'] not in g.fields:
+        if args['phonetic_field'] not in base_fields:
             error('field', args['phonetic_field'], g.data, sorted(g.fields))
 
     # Failing on unknown fields
@@ -2614,10 +2896,10 @@ def main():
         if f is not None
     ] + graph_fields
 
-    for field in args['show'] + args['show_additional'] + args['omit'] + fields_to_test:
+    for field in chain(args['show'], args['show_additional'], args['omit'], fields_to_test):
         field, ext_field = check_ext_field(g, field)
 
-        if field not in [REF] + g.fields:
+        if field not in valid_fields:
             # Join fields call are ok, but they are not in self.fields
             if not g.hasJoin(field):
                 error('field', field, g.data, sorted([REF]    + \
@@ -2646,7 +2928,7 @@ def main():
     # MAIN
     #
     if verbose:
-        if not stdin.isatty() and interactive_query_mode:
+        if not sys.stdin.isatty() and interactive_query_mode:
             print 'Looking for matches from stdin query: %s search %s' % \
                     (interactive_type,
                      '' if interactive_type == '__key__' else 'on %s...' % interactive_field)
@@ -2658,17 +2940,25 @@ def main():
     # Keeping track of last filter applied
     last = None
 
+    # Results not sorted yet, only the "limit" first will be
+    partial_sort = False
+
+    # Keys given by user may be unknown, they are all checked
+    user_keys = False
+
     # Keeping only keys in intermediate search
-    ex_keys = lambda res : None if res is None else (e[1] for e in res)
+    ex_keys = lambda res : None if res is None else imap(itemgetter(1), res)
 
     # We start from either all keys available or keys listed by user
     # or from stdin if there is input
-    if not stdin.isatty() and interactive_query_mode:
-        values = [row.strip() for row in stdin]
+    if not sys.stdin.isatty() and interactive_query_mode:
+        # Lines are consumed lazily, stdin is never stored whole
+        values = (row.strip() for row in sys.stdin)
         # Query type
         if interactive_type == '__key__':
             res = enumerate(values)
             last = None
+            user_keys = True
 
         elif interactive_type == '__exact__':
             # Indexing if not already done at init
@@ -2677,7 +2967,7 @@ def main():
             res = []
             for val in values:
                 conditions = [(interactive_field, val)]
-                res.extend(list(g.findWith(conditions, force_str=FORCE_STR, mode='or', verbose=logorrhea)))
+                res.extend(g.findWith(conditions, force_str=FORCE_STR, mode='or', verbose=logorrhea))
 
             # Other way to do it by putting all lines in one *or* condition
             # But for over 1000 lines, this becomes slower than querying each line
@@ -2688,17 +2978,18 @@ def main():
         elif interactive_type == '__fuzzy__':
             res = []
             for val in values:
-                res.extend(list(g.fuzzyFindCached(val, interactive_field, min_match=args['fuzzy_limit'], verbose=logorrhea)))
+                res.extend(g.fuzzyFindCached(val, interactive_field, min_match=args['fuzzy_limit'], verbose=logorrhea))
             last = 'fuzzy'
 
         elif interactive_type == '__phonetic__':
             res = []
             for val in values:
-                res.extend(list(g.phoneticFind(val, interactive_field, method=phonetic_method, verbose=logorrhea)))
+                res.extend(g.phoneticFind(val, interactive_field, method=phonetic_method, verbose=logorrhea))
             last = 'phonetic'
 
     elif args['keys']:
         res = enumerate(args['keys'])
+        user_keys = True
     else:
         res = enumerate(g)
 
@@ -2726,7 +3017,7 @@ def main():
             else:
                 print '(*) Applying: field %s' % (' %s ' % mode).join('%s == "%s"' % c for c in conditions)
 
-        res = list(g.findWith(conditions, from_keys=ex_keys(res), reverse=args['reverse'], mode=mode, force_str=FORCE_STR, verbose=logorrhea))
+        res = g.findWith(conditions, from_keys=ex_keys(res), reverse=args['reverse'], mode=mode, force_str=FORCE_STR, verbose=logorrhea)
         last = 'exact'
 
 
@@ -2735,7 +3026,7 @@ def main():
         if verbose:
             print '(*) Applying: field %s ~= "%s" (%.1f%%)' % (args['fuzzy_field'], args['fuzzy'], 100 * args['fuzzy_limit'])
 
-        res = list(g.fuzzyFind(args['fuzzy'], args['fuzzy_field'], min_match=args['fuzzy_limit'], from_keys=ex_keys(res)))
+        res = g.fuzzyFind(args['fuzzy'], args['fuzzy_field'], min_match=args['fuzzy_limit'], from_keys=ex_keys(res))
         last = 'fuzzy'
 
 
@@ -2754,7 +3045,14 @@ def main():
             print '(*) Applying: near %s km from "%s" (%s grid)' % (args['near_limit'], args['near'], 'with' if with_grid else 'without')
 
         coords = scan_coords(args['near'], g, verbose)
-        res = sorted(g.findNearPoint(coords, radius=args['near_limit'], grid=with_grid, from_keys=ex_keys(res)))
+        res = list(g.findNearPoint(coords, radius=args['near_limit'], grid=with_grid, from_keys=ex_keys(res)))
+
+        if limit is not None and limit >= 0 and args['closest'] is None:
+            # Only the "limit" closest will be displayed, they
+            # are selected after unknown keys are removed
+            partial_sort = True
+        else:
+            res.sort()
         last = 'near'
 
 
@@ -2764,7 +3062,7 @@ def main():
             print '(*) Applying: closest %s from "%s" (%s grid)' % (args['closest_limit'], args['closest'], 'with' if with_grid else 'without')
 
         coords = scan_coords(args['closest'], g, verbose)
-        res = list(g.findClosestFromPoint(coords, N=args['closest_limit'], grid=with_grid, from_keys=ex_keys(res)))
+        res = g.findClosestFromPoint(coords, N=args['closest_limit'], grid=with_grid, from_keys=ex_keys(res))
         last = 'closest'
 
 
@@ -2773,27 +3071,43 @@ def main():
     # DISPLAY
     #
 
-    # Saving to list
-    res = list(res)
+    # Saving to list, removing unknown keys in the same pass
+    # Results are lazy until here, so unless we have to count
+    # them all, or warn about all unknown keys given by user,
+    # we stop consuming them once the limit is reached
+    contains = g.__contains__
+    filtered = []
 
-    # We clock the time here because now the res iterator has been used
-    if logorrhea:
-        end = datetime.now()
-        print 'Done in %s = (load) %s + (search) %s' % \
-                (end - before_init, after_init - before_init, end - after_init)
+    if verbose or partial_sort or user_keys:
+        stop_at = None
+    else:
+        stop_at = limit
 
-    # Removing unknown keys
     for h, k in res:
-        if k not in g:
+        if contains(k):
+            filtered.append((h, k))
+
+            if len(filtered) == stop_at:
+                break
+        else:
             warn('key', k, g.data, g.loaded)
 
-    res = [(h, k) for h, k in res if k in g]
+    res = filtered
+
+    # We clock the time here because now the res iterator has been used
+    # In quiet mode, it may have been used only up to the limit
+    if logorrhea:
+        end = time()
+        print 'Done in %.3fs = (load) %.3fs + (search) %.3fs' % \
+                (end - before_init, after_init - before_init, end - after_init)
 
 
     # Keeping only "limit" first results
     nb_res_ini = len(res)
 
-    if limit is not None:
+    if partial_sort:
+        res = heapq.nsmallest(limit, res)
+    elif limit is not None:
         res = res[:limit]
 
     nb_res = len(res)
@@ -2886,14 +3200,17 @@ def main():
                              indent=4)
 
 
+    # Omitted fields, for both terminal and quiet displays
+    omit = frozenset(args['omit'])
+
     if frontend == 'terminal':
-        shown_fields = fields_to_show([REF] + g.fields[:],
-                                      set(args['omit']),
+        shown_fields = fields_to_show([REF] + g.fields,
+                                      omit,
                                       args['show'],
                                       args['show_additional'])
 
         print
-        display_terminal(g, res, shown_fields, ref_type, important)
+        display_terminal(g, res, shown_fields, ref_type, important, with_colors)
 
     if frontend == 'quiet':
         # As default, we do not put special fields
@@ -2906,7 +3223,7 @@ def main():
         ]
 
         shown_fields = fields_to_show(defaults,
-                                      set(args['omit']),
+                                      omit,
                                       args['show'],
                                       args['show_additional'])
 
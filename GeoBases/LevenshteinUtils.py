@@ -351,6 +351,10 @@ def mod_leven(str1, str2, heuristic_inclusion=HEURISTIC_INCLUSION, heuristic_inc
     if not str1 or not str2:
         return 0.
 
+    # Exact match after cleaning, no need for Levenshtein
+    if str1 == str2:
+        return 1.
+
     r = LevenRatio('+'.join(str1), '+'.join(str2))
 
     # Perfect match, finished
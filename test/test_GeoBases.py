@@ -10,6 +10,9 @@ import doctest
 
 import os
 import sys
+import time
+import shutil
+import tempfile
 
 # PYTHON PATH MANAGEMENT
 DIRNAME = os.path.dirname(__file__)
@@ -29,6 +32,8 @@ import GeoBases.GeoUtils         as GeoU
 import GeoBases.LevenshteinUtils as GeoL
 import GeoBases.SourcesManagerModule as GeoS
 
+import GeoBaseMain as GeoMain
+
 
 
 class GeoBaseTest(unittest.TestCase):
@@ -81,6 +86,70 @@ class GeoBaseFeedTest(unittest.TestCase):
         self.assertEqual(self.g.keys(), ['1', '2'])
 
 
+class GeoBaseCacheTest(unittest.TestCase):
+    """This class tests the pickle cache of the command line.
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.data    = os.path.join(self.tmp_dir, 'data.csv')
+        self.now     = time.time()
+
+        # Pickles go to the temporary directory
+        self.cache_dir = GeoMain.BASES_CACHE_DIR
+        GeoMain.BASES_CACHE_DIR = os.path.join(self.tmp_dir, 'bases')
+
+    def tearDown(self):
+        GeoMain.BASES_CACHE_DIR = self.cache_dir
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, content, mtime):
+        """Write data file, with a given modification time.
+        """
+        with open(self.data, 'w') as fl:
+            fl.write(content)
+        os.utime(self.data, (mtime, mtime))
+
+    def load(self):
+        """Load data file with the cache.
+        """
+        return GeoMain.load_base('feed',
+                                 paths=self.data,
+                                 headers=['name', 'vol'],
+                                 key_fields=None)
+
+    def test_dependencies(self):
+        self.write('A^2\n', self.now)
+        self.assertIn(self.data, GeoMain.base_dependencies(self.load()))
+
+    def test_fresh(self):
+        self.write('A^2\n', self.now - 100)
+        self.assertEqual(self.load().get('1', 'vol'), '2')
+
+        # Data file is still older than the pickle, which is used
+        self.write('A^3\n', self.now - 100)
+        self.assertEqual(self.load().get('1', 'vol'), '2')
+
+    def test_rebuild(self):
+        self.write('A^2\n', self.now - 100)
+        self.assertEqual(self.load().get('1', 'vol'), '2')
+
+        # Data file is now more recent, the base is rebuilt
+        self.write('A^3\n', self.now + 100)
+        self.assertEqual(self.load().get('1', 'vol'), '3')
+
+    def test_evict(self):
+        os.makedirs(GeoMain.BASES_CACHE_DIR)
+
+        for i, name in enumerate(['a.pkl', 'b.pkl', 'c.pkl']):
+            path = os.path.join(GeoMain.BASES_CACHE_DIR, name)
+            open(path, 'w').close()
+            os.utime(path, (self.now + i, self.now + i))
+
+        GeoMain.evict_bases(2)
+        self.assertEqual(sorted(os.listdir(GeoMain.BASES_CACHE_DIR)),
+                         ['b.pkl', 'c.pkl'])
+
+
 def test_suite():
     """Create a test suite of all doctests.
     """
@@ -93,6 +162,7 @@ def test_suite():
     # Adding unittests
     tests.addTests(unittest.makeSuite(GeoBaseTest))
     tests.addTests(unittest.makeSuite(GeoBaseFeedTest))
+    tests.addTests(unittest.makeSuite(GeoBaseCacheTest))
 
     # Standard options for DocTests
     opt =  (doctest.ELLIPSIS |